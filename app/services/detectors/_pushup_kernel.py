@@ -0,0 +1,68 @@
+# Create: app/services/detectors/_pushup_kernel.py
+
+import numpy as np
+
+# Phase codes shared with PushupDetector
+PHASE_NEUTRAL = 0
+PHASE_UP = 1
+PHASE_DOWN = 2
+PHASE_TRANSITION = 3
+
+PHASE_NAMES = ("neutral", "up", "down", "transition")
+
+# Numba is optional - if it isn't installed, PushupDetector falls back
+# to its pure-NumPy scoring path
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+
+if HAVE_NUMBA:
+    @njit(cache=True, fastmath=True)
+    def phase_code(coords: np.ndarray) -> int:
+        """Geometric pushup-phase rules compiled to native code
+
+        Takes the (33, 2) float32 coords array and returns a phase code.
+        Thresholds/weights mirror the NumPy path in PushupDetector.
+        """
+        avg_wrist_y = (coords[15, 1] + coords[16, 1]) / 2
+        avg_shoulder_y = (coords[11, 1] + coords[12, 1]) / 2
+        avg_elbow_y = (coords[13, 1] + coords[14, 1]) / 2
+        nose_y = coords[0, 1]
+
+        wrist_diff = avg_wrist_y - avg_shoulder_y
+        elbow_diff = avg_elbow_y - avg_shoulder_y
+        nose_diff = nose_y - avg_shoulder_y
+
+        up_indicators = 0
+        down_indicators = 0
+
+        if wrist_diff < -0.15:
+            up_indicators += 2
+        elif wrist_diff > 0.1:
+            down_indicators += 1
+
+        if elbow_diff < -0.05:
+            up_indicators += 1
+        elif elbow_diff > 0.05:
+            down_indicators += 1
+
+        if nose_diff < -0.1:
+            up_indicators += 1
+        elif nose_diff > 0.05:
+            down_indicators += 1
+
+        if up_indicators >= 2:
+            return PHASE_UP
+        elif down_indicators >= 2:
+            return PHASE_DOWN
+        return PHASE_TRANSITION
+
+    # Warm the kernel at import time so the (slow) first compile happens
+    # once and gets written to Numba's on-disk cache - subsequent runs
+    # just load the cached machine code
+    phase_code(np.zeros((33, 2), dtype=np.float32))
+else:
+    phase_code = None
@@ -3,97 +3,165 @@
 import numpy as np
 from typing import List, Tuple, Optional
 from collections import deque
+from functools import lru_cache
 import time
 
+from app.services.detectors import _pushup_kernel
+from app.services.detectors._pushup_kernel import (
+    PHASE_NEUTRAL, PHASE_UP, PHASE_DOWN, PHASE_TRANSITION, PHASE_NAMES
+)
+
+@lru_cache(maxsize=4096)
+def _phase_names_for(window: Tuple[int, ...]) -> Tuple[str, ...]:
+    """Map a window of phase codes to their names
+
+    Pure function of a short tuple over 4 codes (4^10 inputs at most,
+    far fewer in practice), so every repeated window is a single hash
+    plus dict lookup instead of rebuilding the string list per frame.
+    """
+    return tuple(PHASE_NAMES[c] for c in window)
+
+
 class PushupDetector:
     """Rule-based pushup detection optimized for reliability"""
-    
+
     def __init__(self):
         self.rep_count = 0
         self.current_phase = "neutral"
         self.last_phase = "neutral"
-        self.phase_history = deque(maxlen=10)
+        self._current_code = PHASE_NEUTRAL
+        # Phase history as a preallocated int8 ring buffer (capacity 10)
+        # instead of a deque of Python objects - appends just write a
+        # byte and bump the head index
+        self._history_ring = np.full(10, -1, dtype=np.int8)
+        self._history_head = 0
+        self._history_len = 0
+        # Recent coords kept as float16 copies (~10s at 30 fps) for ML
+        # training-data collection - half the memory of float32, and the
+        # 0.05-granularity thresholds lose nothing. Cast back to float32
+        # before doing arithmetic on these.
+        self.landmark_history = deque(maxlen=300)
         self.last_rep_time = 0
         self.min_rep_interval = 1.0  # Minimum seconds between reps
-        self.position_history = deque(maxlen=5)
-        
-    def detect_pushup_phase(self, landmarks: List[Tuple[float, float]]) -> str:
+        # Fixed-size ring buffer of recent phase codes plus per-code
+        # counts, so the majority-vote smoothing is O(1) per frame
+        self._position_ring = np.full(5, -1, dtype=np.int8)
+        self._position_head = 0
+        self._position_filled = 0
+        self._phase_counts = np.zeros(4, dtype=np.int32)
+
+        # Threshold tables for the three up/down indicators
+        # (wrist-shoulder, elbow-shoulder, nose-shoulder diffs)
+        self._thr_up = np.array([-0.15, -0.05, -0.10], dtype=np.float32)
+        self._thr_down = np.array([0.1, 0.05, 0.05], dtype=np.float32)
+
+        # Partial evaluation of the indicator rules: each diff buckets
+        # to {-1, 0, +1} against its two thresholds, and the 27 possible
+        # bucket triplets map straight to a phase code through this LUT,
+        # built once here from the same weighted-indicator rules
+        # (wrists-above-shoulders counts double for "up").
+        self._lut_stride = np.array([9, 3, 1], dtype=np.int8)
+        self._phase_lut = np.empty(27, dtype=np.int8)
+        up_weights = (2, 1, 1)
+        for b0 in (-1, 0, 1):
+            for b1 in (-1, 0, 1):
+                for b2 in (-1, 0, 1):
+                    buckets = (b0, b1, b2)
+                    up = sum(w for w, b in zip(up_weights, buckets) if b == -1)
+                    down = sum(1 for b in buckets if b == 1)
+                    if up >= 2:
+                        code = PHASE_UP
+                    elif down >= 2:
+                        code = PHASE_DOWN
+                    else:
+                        code = PHASE_TRANSITION
+                    self._phase_lut[(b0 + 1) * 9 + (b1 + 1) * 3 + (b2 + 1)] = code
+
+        # Rep detection as a tiny state machine driven by lookup tables:
+        # rows are meta-states (0=idle, 1=saw down, 2=down then
+        # transition/neutral), cols are phase codes. One table gives the
+        # next meta-state, the other emits 1 when a rep completes
+        # (down -> intermediate -> up, matching the old pattern scan).
+        self._meta_state = 0
+        #                            neutral up down transition
+        self._next_state = np.array([[0,     0,  1,   0],   # idle
+                                     [2,     0,  1,   2],   # saw down
+                                     [2,     0,  1,   2]],  # down + mid
+                                    dtype=np.int8)
+        self._rep_delta = np.array([[0, 0, 0, 0],
+                                    [0, 0, 0, 0],
+                                    [0, 1, 0, 0]], dtype=np.int8)
+
+        # Use the Numba-compiled kernel when available, else pure NumPy
+        if _pushup_kernel.HAVE_NUMBA:
+            self._phase_fn = _pushup_kernel.phase_code
+        else:
+            self._phase_fn = self._phase_code_numpy
+        
+    def _phase_code_numpy(self, coords: np.ndarray) -> int:
+        """Pure-NumPy fallback for the geometric phase rules"""
+        # Calculate positions by indexing y-column of the (33, 2) coords array
+        avg_wrist_y = (coords[15, 1] + coords[16, 1]) / 2
+        avg_shoulder_y = (coords[11, 1] + coords[12, 1]) / 2
+        avg_elbow_y = (coords[13, 1] + coords[14, 1]) / 2
+        nose_y = coords[0, 1]
+
+        # Three detection methods combined for robustness:
+        # wrist-shoulder relationship, elbow angle approximation,
+        # and overall body position (nose relative to shoulders)
+        diffs = np.array([avg_wrist_y - avg_shoulder_y,
+                          avg_elbow_y - avg_shoulder_y,
+                          nose_y - avg_shoulder_y], dtype=np.float32)
+
+        # Bucket each diff to {-1, 0, +1} against its thresholds, then
+        # the precomputed LUT resolves the phase - no if/elif chain left
+        buckets = (diffs > self._thr_down).astype(np.int8) \
+            - (diffs < self._thr_up).astype(np.int8)
+        return int(self._phase_lut[(buckets + 1) @ self._lut_stride])
+
+    def detect_pushup_phase(self, landmarks: np.ndarray) -> str:
         """Detect pushup phase using reliable geometric rules"""
+        return PHASE_NAMES[self._detect_phase_code(landmarks)]
+
+    def _detect_phase_code(self, landmarks: np.ndarray) -> int:
+        """Phase detection on int codes - the per-frame hot path"""
         if len(landmarks) != 33:
-            return "neutral"
-        
-        # Key landmarks
-        left_wrist = landmarks[15]
-        right_wrist = landmarks[16] 
-        left_shoulder = landmarks[11]
-        right_shoulder = landmarks[12]
-        left_elbow = landmarks[13]
-        right_elbow = landmarks[14]
-        nose = landmarks[0]
-        
-        # Calculate positions
-        avg_wrist_y = (left_wrist[1] + right_wrist[1]) / 2
-        avg_shoulder_y = (left_shoulder[1] + right_shoulder[1]) / 2
-        avg_elbow_y = (left_elbow[1] + right_elbow[1]) / 2
-        nose_y = nose[1]
-        
-        # Multiple detection methods for robustness
-        
-        # Method 1: Wrist-shoulder relationship
-        wrist_shoulder_diff = avg_wrist_y - avg_shoulder_y
-        
-        # Method 2: Elbow angle approximation
-        elbow_shoulder_diff = avg_elbow_y - avg_shoulder_y
-        
-        # Method 3: Overall body position (nose relative to shoulders)
-        nose_shoulder_diff = nose_y - avg_shoulder_y
-        
-        # Combine methods for robust detection
-        up_indicators = 0
-        down_indicators = 0
-        
-        # Indicator 1: Wrists above shoulders (strong up signal)
-        if wrist_shoulder_diff < -0.15:
-            up_indicators += 2
-        elif wrist_shoulder_diff > 0.1:
-            down_indicators += 1
-            
-        # Indicator 2: Elbows position
-        if elbow_shoulder_diff < -0.05:
-            up_indicators += 1
-        elif elbow_shoulder_diff > 0.05:
-            down_indicators += 1
-            
-        # Indicator 3: Head position (pushup form)
-        if nose_shoulder_diff < -0.1:
-            up_indicators += 1
-        elif nose_shoulder_diff > 0.05:
-            down_indicators += 1
-        
-        # Decision logic
-        if up_indicators >= 2:
-            phase = "up"
-        elif down_indicators >= 2:
-            phase = "down"
-        else:
-            phase = "transition"
-            
-        # Smooth the detection
-        self.position_history.append(phase)
-        
-        # Use majority vote from recent history for stability
-        if len(self.position_history) >= 3:
-            recent_phases = list(self.position_history)[-3:]
-            phase_counts = {p: recent_phases.count(p) for p in set(recent_phases)}
-            phase = max(phase_counts, key=phase_counts.get)
-        
-        return phase
+            return PHASE_NEUTRAL
+
+        code = self._phase_fn(landmarks)
+
+        # Smooth the detection with a majority vote over recent history.
+        # The ring buffer and per-code counts are updated incrementally,
+        # so the vote is a single argmax with no rescans per frame.
+        # (hot attributes bound to locals: LOAD_FAST beats LOAD_ATTR)
+        ring = self._position_ring
+        counts = self._phase_counts
+        head = self._position_head
+        evicted = ring[head]
+        if evicted >= 0:
+            counts[evicted] -= 1
+        ring[head] = code
+        counts[code] += 1
+        self._position_head = (head + 1) % len(ring)
+        if self._position_filled < len(ring):
+            self._position_filled += 1
+
+        if self._position_filled >= 3:
+            code = int(np.argmax(counts))
+
+        return code
     
-    def update(self, landmarks: List[Tuple[float, float]]) -> dict:
+    def update(self, landmarks: np.ndarray) -> dict:
         """Update detector state and check for rep completion"""
         self.last_phase = self.current_phase
-        self.current_phase = self.detect_pushup_phase(landmarks)
-        self.phase_history.append(self.current_phase)
+        code = self._detect_phase_code(landmarks)
+        self._current_code = code
+        self.current_phase = PHASE_NAMES[code]
+        self._history_ring[self._history_head] = code
+        self._history_head = (self._history_head + 1) % len(self._history_ring)
+        if self._history_len < len(self._history_ring):
+            self._history_len += 1
+        self.landmark_history.append(landmarks.astype(np.float16))
         
         # Check for rep completion
         rep_completed = self.check_rep_completion()
@@ -102,40 +170,36 @@ class PushupDetector:
             'phase': self.current_phase,
             'rep_count': self.rep_count,
             'rep_completed': rep_completed,
-            'phase_history': list(self.phase_history)
+            'phase_history': _phase_names_for(self._history_window())
         }
     
+    def _history_window(self) -> Tuple[int, ...]:
+        """Phase codes currently in the ring, oldest first"""
+        ring = self._history_ring
+        n = self._history_len
+        start = self._history_head - n
+        return tuple(int(ring[(start + i) % len(ring)]) for i in range(n))
+
     def check_rep_completion(self) -> bool:
-        """Detect completed rep using phase transitions"""
-        if len(self.phase_history) < 4:
-            return False
-            
-        current_time = time.time()
-        if current_time - self.last_rep_time < self.min_rep_interval:
-            return False
-        
-        # Look for down->up transition pattern
-        recent = list(self.phase_history)[-6:]  # Last 6 phases
-        
-        # Pattern matching for rep completion
-        has_down = "down" in recent[:-1]  # Had down position
-        is_up_now = recent[-1] == "up"    # Currently up
-        
-        # Additional validation: ensure we had a proper transition
-        if has_down and is_up_now:
-            # Count transitions to ensure it's a complete movement
-            transitions = 0
-            for i in range(1, len(recent)):
-                if recent[i] != recent[i-1]:
-                    transitions += 1
-            
-            # Valid rep needs at least 2 transitions (down->transition->up minimum)
-            if transitions >= 2:
-                self.count_rep()
-                return True
-        
+        """Detect completed rep using the phase transition table"""
+        code = self._current_code
+        state = self._meta_state
+
+        # Single O(1) table lookup replaces the old window scan over
+        # recent phases - a rep fires on down -> intermediate -> up
+        delta = int(self._rep_delta[state, code])
+        self._meta_state = int(self._next_state[state, code])
+
+        if delta:
+            # Separate timestamp guard against double counting
+            current_time = time.time()
+            if current_time - self.last_rep_time < self.min_rep_interval:
+                return False
+            self.count_rep()
+            return True
+
         return False
-    
+
     def count_rep(self):
         """Register a completed rep"""
         self.rep_count += 1
@@ -143,11 +207,19 @@ class PushupDetector:
         print(f"🎉 Rep {self.rep_count} completed!")
         
         # Clear recent history to avoid double counting
-        self.phase_history.clear()
+        self._history_ring.fill(-1)
+        self._history_len = 0
         
     def reset(self):
         """Reset counter"""
         self.rep_count = 0
-        self.phase_history.clear()
-        self.position_history.clear()
+        self._history_ring.fill(-1)
+        self._history_head = 0
+        self._history_len = 0
+        self.landmark_history.clear()
+        self._meta_state = 0
+        self._position_ring.fill(-1)
+        self._position_head = 0
+        self._position_filled = 0
+        self._phase_counts.fill(0)
         self.last_rep_time = 0
\ No newline at end of file
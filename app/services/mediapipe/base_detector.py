@@ -4,43 +4,93 @@ import cv2
 import mediapipe as mp
 import numpy as np
 from typing import Optional, List, Tuple
+from collections import OrderedDict
 import logging
+import os
 
 class BasePoseDetector:
     """Optimized pose detector for ML-based movement detection"""
+
+    # Key connections for pushups (arms and torso)
+    _connections = np.array([
+        (11, 13), (13, 15),  # Left arm
+        (12, 14), (14, 16),  # Right arm
+        (11, 23), (12, 24),  # Torso sides
+        (23, 24)             # Hip line
+    ], dtype=np.int32)
     
     def __init__(self, 
                  min_detection_confidence=0.7,
-                 min_tracking_confidence=0.5):
+                 min_tracking_confidence=0.5,
+                 motion_threshold=2.0,
+                 frame_cache_size=0,
+                 model_complexity=1,
+                 smooth_landmarks=True):
         """
         Simplified initialization focused on performance for ML inference
         
         Args:
             min_detection_confidence: Higher threshold for better accuracy
             min_tracking_confidence: Confidence for landmark tracking
+            motion_threshold: mean pixel delta (on a 64x36 grayscale
+                thumbnail) below which inference is skipped and the last
+                landmarks are reused; 0 disables the gate
+            frame_cache_size: max entries in the perceptual-hash result
+                cache for replay/upload workloads that re-infer identical
+                frames; 0 (default) disables it for live-camera mode
+            model_complexity: MediaPipe model variant - 0 (Lite) is
+                roughly 2x faster on CPU and plenty for rule-based rep
+                counting, 1 (Full) when landmark precision matters
+            smooth_landmarks: MediaPipe's internal temporal filter;
+                disable if downstream smoothing makes it redundant
         """
         self.mp_pose = mp.solutions.pose
         
         # Optimized settings for real-time ML inference
         self.pose = self.mp_pose.Pose(
             static_image_mode=False,
-            model_complexity=1,              # Good balance of speed/accuracy
-            smooth_landmarks=True,           # Important for temporal sequences
+            model_complexity=model_complexity,
+            smooth_landmarks=smooth_landmarks,
             enable_segmentation=False,       # Not needed, saves processing
             min_detection_confidence=min_detection_confidence,
             min_tracking_confidence=min_tracking_confidence
         )
         
         # Only the landmarks we actually use in ML training
-        self.ml_landmarks = [
+        # (tuple: frozen and slightly faster to iterate than a list)
+        self.ml_landmarks = (
             11, 12,  # shoulders
             13, 14,  # elbows
             15, 16,  # wrists
             23, 24,  # hips
             25, 26,  # knees
             27, 28   # ankles
-        ]
+        )
         
+        # Reusable RGB conversion buffer (lazily allocated on first frame)
+        self._rgb_buffer = None
+
+        # Delta-frame gate: when the scene barely changed since the last
+        # inferred frame, reuse the cached landmarks instead of paying
+        # for another MediaPipe pass (common while idle between reps)
+        self.motion_threshold = motion_threshold
+        self._prev_small = None
+        self._cached_landmarks = None
+        self._cached_quality = 0.0
+
+        # Bounded LRU cache of results keyed by a 64-bit dHash of the
+        # frame - useful for uploaded videos and loop-replays where the
+        # exact same frames come around again
+        self._frame_cache_size = frame_cache_size
+        self._frame_cache = OrderedDict() if frame_cache_size > 0 else None
+
+        # Persistent visibility scratch buffer - filled once per frame and
+        # shared between the visibility gate and the quality score
+        self._ml_idx = np.array(self.ml_landmarks, dtype=np.int32)
+        self._vis = np.empty(len(self.ml_landmarks), dtype=np.float32)
+        self._visible = np.zeros(33, dtype=bool)  # per-landmark >0.5 flags
+        self.last_quality = 0.0
+
         self.logger = logging.getLogger(__name__)
     
     def process(self, image: np.ndarray) -> Optional[object]:
@@ -53,39 +103,112 @@ class BasePoseDetector:
         Returns:
             Pose landmarks object or None if no pose detected
         """
+        # Motion gate: compare a grayscale thumbnail against the one
+        # from the last inferred frame and skip inference if static
+        if self.motion_threshold > 0:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            small = cv2.resize(gray, (64, 36), interpolation=cv2.INTER_AREA)
+            if self._prev_small is not None and self._cached_landmarks is not None:
+                diff = cv2.absdiff(small, self._prev_small).mean()
+                if diff < self.motion_threshold:
+                    self.last_quality = self._cached_quality
+                    return self._cached_landmarks
+            self._prev_small = small
+
+        # Replay cache: identical frames (by perceptual hash) reuse
+        # their previous result instead of re-running inference
+        if self._frame_cache is not None:
+            cache_key = self._frame_hash(image)
+            hit = self._frame_cache.get(cache_key)
+            if hit is not None:
+                self._frame_cache.move_to_end(cache_key)
+                self.last_quality = hit[1]
+                return hit[0]
+
+        # Convert BGR to RGB (required by MediaPipe) into a reused
+        # buffer instead of allocating a fresh H x W x 3 array per frame.
+        # No try around this: a cvtColor failure is a config bug, not
+        # per-frame noise worth swallowing.
+        if self._rgb_buffer is None or self._rgb_buffer.shape != image.shape:
+            self._rgb_buffer = np.empty_like(image)
+        cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=self._rgb_buffer)
+
+        # Mark read-only so MediaPipe's wrapper can skip its own copy.
+        # Only the inference call itself is guarded - it's the one thing
+        # here that can legitimately fail at runtime.
+        self._rgb_buffer.flags.writeable = False
         try:
-            # Convert BGR to RGB (required by MediaPipe)
-            rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            
-            # Process with MediaPipe
-            results = self.pose.process(rgb_image)
-            
-            # Return landmarks if pose detected with good confidence
-            if results.pose_landmarks:
-                # Quick visibility check for key landmarks
-                key_visible = sum(1 for i in self.ml_landmarks 
-                                if results.pose_landmarks.landmark[i].visibility > 0.5)
-                
-                if key_visible >= len(self.ml_landmarks) * 0.6:  # At least 60% visible
-                    return results.pose_landmarks
-            
-            return None
-            
-        except Exception as e:
+            results = self.pose.process(self._rgb_buffer)
+        except RuntimeError as e:
             self.logger.error(f"MediaPipe processing error: {e}")
             return None
-    
-    def extract_ml_coordinates(self, landmarks) -> List[Tuple[float, float]]:
+        finally:
+            self._rgb_buffer.flags.writeable = True
+
+        # Return landmarks if pose detected with good confidence
+        if results.pose_landmarks:
+            quality, visible_enough = self._check_visibility(results.pose_landmarks)
+            self.last_quality = quality
+
+            if visible_enough:  # At least 60% of key landmarks visible
+                self._cached_landmarks = results.pose_landmarks
+                self._cached_quality = quality
+                if self._frame_cache is not None:
+                    self._frame_cache[cache_key] = (results.pose_landmarks, quality)
+                    if len(self._frame_cache) > self._frame_cache_size:
+                        self._frame_cache.popitem(last=False)  # evict LRU
+                return results.pose_landmarks
+
+        # Pose lost (or too occluded) - drop the motion-gate cache so
+        # we don't keep serving stale landmarks
+        self._cached_landmarks = None
+        self._prev_small = None
+        return None
+
+    @staticmethod
+    def _frame_hash(image: np.ndarray) -> bytes:
+        """
+        Cheap 64-bit dHash of a frame: compare adjacent columns of a
+        9x8 grayscale thumbnail and pack the bits
+        """
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+        return np.packbits(small[:, 1:] > small[:, :-1]).tobytes()
+
+    def extract_ml_coordinates(self, landmarks) -> np.ndarray:
         """
         Extract normalized (x, y) coordinates optimized for ML model
-        Returns exactly what your ML model expects: 33 landmarks as (x, y) pairs
+        Returns a (33, 2) float32 array - one row per landmark, same order
+        as the training data
         """
         if not landmarks:
-            return []
-        
-        # Return all 33 landmarks as (x, y) tuples - matches your training data
-        return [(lm.x, lm.y) for lm in landmarks.landmark]
-    
+            return np.empty((0, 2), dtype=np.float32)
+
+        # Single preallocated array instead of 33 tuple allocations per frame
+        coords = np.empty((33, 2), dtype=np.float32)
+        lms = landmarks.landmark
+        for i in range(33):
+            lm = lms[i]
+            coords[i, 0] = lm.x
+            coords[i, 1] = lm.y
+        return coords
+
+    def _check_visibility(self, landmarks) -> Tuple[float, bool]:
+        """
+        Fill the visibility scratch buffer in one pass and return both
+        the average quality score and whether enough key landmarks are
+        visible (>= 60% above the 0.5 threshold)
+        """
+        lms = landmarks.landmark
+        vis = self._vis
+        for i, idx in enumerate(self.ml_landmarks):
+            vis[i] = lms[idx].visibility
+        self._visible[self._ml_idx] = vis > 0.5
+
+        quality = float(vis.mean())
+        visible_enough = np.count_nonzero(vis > 0.5) >= 0.6 * len(vis)
+        return quality, visible_enough
+
     def get_landmark_quality(self, landmarks) -> float:
         """
         Get overall quality score of detected landmarks
@@ -93,48 +216,70 @@ class BasePoseDetector:
         """
         if not landmarks:
             return 0.0
-        
-        # Calculate average visibility of key landmarks
-        key_visibilities = [landmarks.landmark[i].visibility for i in self.ml_landmarks]
-        return sum(key_visibilities) / len(key_visibilities)
+
+        quality, _ = self._check_visibility(landmarks)
+        return quality
     
-    def draw_minimal_landmarks(self, image: np.ndarray, landmarks) -> np.ndarray:
+    def draw_minimal_landmarks(self, image: np.ndarray, landmarks,
+                               coords: Optional[np.ndarray] = None) -> np.ndarray:
         """
         Draw minimal landmarks for debugging (only key points for ML)
         Much faster than full landmark drawing
+
+        Pass the coords array from extract_ml_coordinates to avoid
+        re-reading the protobuf landmarks.
         """
         if not landmarks:
             return image
-        
+
         h, w = image.shape[:2]
-        
+
+        if coords is None:
+            coords = self.extract_ml_coordinates(landmarks)
+
+        # Scale all landmarks to pixel space in one vectorized pass,
+        # then just index - no per-landmark float multiplies below
+        pixels = (coords * np.array([w, h], dtype=np.float32)).astype(np.int32)
+        visible = self._visible
+
         # Draw only key landmarks as circles
         for idx in self.ml_landmarks:
-            landmark = landmarks.landmark[idx]
-            if landmark.visibility > 0.5:
-                x = int(landmark.x * w)
-                y = int(landmark.y * h)
-                cv2.circle(image, (x, y), 4, (0, 255, 0), -1)
-        
-        # Draw key connections for pushups (arms and torso)
-        connections = [
-            (11, 13), (13, 15),  # Left arm
-            (12, 14), (14, 16),  # Right arm
-            (11, 23), (12, 24),  # Torso sides
-            (23, 24)             # Hip line
-        ]
-        
-        for start_idx, end_idx in connections:
-            start_lm = landmarks.landmark[start_idx]
-            end_lm = landmarks.landmark[end_idx]
-            
-            if start_lm.visibility > 0.5 and end_lm.visibility > 0.5:
-                start_pos = (int(start_lm.x * w), int(start_lm.y * h))
-                end_pos = (int(end_lm.x * w), int(end_lm.y * h))
-                cv2.line(image, start_pos, end_pos, (255, 0, 0), 2)
-        
+            if visible[idx]:
+                cv2.circle(image, tuple(pixels[idx]), 4, (0, 255, 0), -1)
+
+        # Draw the precomputed pushup connections (arms and torso)
+        for start_idx, end_idx in self._connections:
+            if visible[start_idx] and visible[end_idx]:
+                cv2.line(image, tuple(pixels[start_idx]),
+                         tuple(pixels[end_idx]), (255, 0, 0), 2)
+
         return image
     
+    @staticmethod
+    def tune_runtime(num_threads: int = 2, cpus: Optional[set] = None):
+        """
+        Pin thread counts and CPU affinity for low-jitter realtime use
+
+        OpenCV, MediaPipe's TFLite delegate and the display loop each
+        bring their own thread pool; on a 4-core laptop that
+        oversubscription shows up as p95 latency spikes rather than
+        lower throughput. Call this once at startup, before the first
+        frame is processed.
+        """
+        os.environ.setdefault("OMP_NUM_THREADS", str(num_threads))
+        os.environ.setdefault("MEDIAPIPE_DISABLE_GPU", "1")  # deterministic CPU path
+        cv2.setNumThreads(num_threads)
+
+        # Confine the process (and every pool it spawns) to a fixed set
+        # of cores - Linux only
+        if hasattr(os, "sched_setaffinity"):
+            if cpus is None:
+                cpus = set(range(min(4, os.cpu_count() or 1)))
+            try:
+                os.sched_setaffinity(0, cpus)
+            except OSError:
+                pass  # containers may forbid changing affinity
+
     def close(self):
         """Clean up MediaPipe resources"""
         if hasattr(self, 'pose'):
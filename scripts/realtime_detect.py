@@ -6,63 +6,132 @@ sys.path.append(str(Path('.').resolve()))
 
 import cv2
 import time
+import queue
+import threading
+import numpy as np
 from app.services.mediapipe.base_detector import BasePoseDetector
 from app.services.detectors.pushup_detector import PushupDetector
 
+# Hoisted out of the frame loop - module-level lookups are done once
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+put_text = cv2.putText
+
+# HUD bitmap size (top-left corner of the frame)
+HUD_H, HUD_W = 150, 320
+
+def capture_frames(cap, frame_queue, stop_event):
+    """Capture thread: keeps only the newest frame in the single-slot queue
+
+    Overlaps camera I/O with MediaPipe inference on the main thread
+    (which releases the GIL during its C++ inference). Stale frames are
+    dropped so inference always runs on the most recent frame.
+    """
+    while not stop_event.is_set():
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frame = cv2.flip(frame, 1)
+        try:
+            frame_queue.put_nowait(frame)
+        except queue.Full:
+            # Consumer is behind - drop the stale frame, queue the new one
+            try:
+                frame_queue.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                frame_queue.put_nowait(frame)
+            except queue.Full:
+                pass
+    stop_event.set()
+
 def main():
     print('🎥 Starting Rule-Based Pushup Detection...')
-    
+
+    # Cap thread pools and pin affinity for steadier frame times
+    BasePoseDetector.tune_runtime()
+
     # Initialize detectors
     cap = cv2.VideoCapture(0)
     if not cap.isOpened():
         print("❌ Could not open camera")
         return
+
+    # Ask the camera for 640x360 directly - no point paying the USB
+    # bandwidth for HD frames when inference runs on a downscaled copy
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 360)
         
-    pose_detector = BasePoseDetector(min_detection_confidence=0.7)
+    # Lite model (complexity 0): ~2x faster on CPU, accurate enough for
+    # the coarse vertical-position rules the pushup counter relies on
+    pose_detector = BasePoseDetector(min_detection_confidence=0.7,
+                                     model_complexity=0)
     pushup_detector = PushupDetector()
     
     print('✅ Ready! Do some pushups!')
     print('Press Q to quit, R to reset counter')
-    
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-            
-        frame = cv2.flip(frame, 1)
-        
-        # Detect pose
-        landmarks = pose_detector.process(frame)
+
+    # HUD text is rasterized only when its contents change; most frames
+    # just blit the cached bitmap instead of re-running putText 3x
+    hud_key = None
+    hud = None
+
+    # Capture runs on its own thread; main thread does inference + draw
+    frame_queue = queue.Queue(maxsize=1)
+    stop_event = threading.Event()
+    capture_thread = threading.Thread(target=capture_frames,
+                                      args=(cap, frame_queue, stop_event),
+                                      daemon=True)
+    capture_thread.start()
+
+    while not stop_event.is_set():
+        try:
+            frame = frame_queue.get(timeout=1.0)
+        except queue.Empty:
+            continue
+
+        # Detect pose on a half-resolution copy - inference cost scales
+        # with input size and the landmarks are normalized [0,1], so
+        # drawing on the full-res frame still lines up
+        small = cv2.resize(frame, (0, 0), fx=0.5, fy=0.5,
+                           interpolation=cv2.INTER_AREA)
+        landmarks = pose_detector.process(small)
         
         if landmarks:
             coords = pose_detector.extract_ml_coordinates(landmarks)
-            quality = pose_detector.get_landmark_quality(landmarks)
-            
+            quality = pose_detector.last_quality  # computed during process()
+
             if quality > 0.6:
                 # Update pushup detection
                 result = pushup_detector.update(coords)
-                
-                # Display results
-                cv2.putText(frame, f"Phase: {result['phase'].upper()}", 
-                           (20, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-                cv2.putText(frame, f"Reps: {result['rep_count']}", 
-                           (20, 90), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 255, 255), 3)
-                cv2.putText(frame, f"Quality: {quality:.2f}", 
-                           (20, 130), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+
+                # Display results via the cached HUD bitmap
+                key = (result['phase'], result['rep_count'], round(quality, 2))
+                if key != hud_key:
+                    hud = np.zeros((HUD_H, HUD_W, 3), dtype=np.uint8)
+                    put_text(hud, f"Phase: {result['phase'].upper()}", 
+                               (20, 50), FONT, 0.8, (0, 255, 0), 2)
+                    put_text(hud, f"Reps: {result['rep_count']}", 
+                               (20, 90), FONT, 1.2, (0, 255, 255), 3)
+                    put_text(hud, f"Quality: {quality:.2f}", 
+                               (20, 130), FONT, 0.6, (255, 255, 255), 1)
+                    hud_key = key
+                roi = frame[:HUD_H, :HUD_W]
+                np.maximum(roi, hud, out=roi)  # text pixels win over video
                 
                 # Draw landmarks
-                frame = pose_detector.draw_minimal_landmarks(frame, landmarks)
+                frame = pose_detector.draw_minimal_landmarks(frame, landmarks, coords)
                 
                 # Rep completion feedback
                 if result['rep_completed']:
-                    cv2.putText(frame, "REP COMPLETED!", (frame.shape[1]//2-100, 100), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 3)
+                    put_text(frame, "REP COMPLETED!", (frame.shape[1]//2-100, 100), 
+                               FONT, 1, (0, 255, 0), 3)
             else:
-                cv2.putText(frame, f"Low Quality: {quality:.2f}", 
-                           (20, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+                put_text(frame, f"Low Quality: {quality:.2f}", 
+                           (20, 50), FONT, 0.8, (0, 0, 255), 2)
         else:
-            cv2.putText(frame, "No Pose Detected", 
-                       (20, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 0, 0), 2)
+            put_text(frame, "No Pose Detected", 
+                       (20, 50), FONT, 0.8, (255, 0, 0), 2)
         
         cv2.imshow('Rule-Based Pushup Counter', frame)
         
@@ -72,7 +141,9 @@ def main():
         elif key == ord('r'):
             pushup_detector.reset()
             print("Counter reset!")
-    
+
+    stop_event.set()
+    capture_thread.join(timeout=2.0)
     cap.release()
     cv2.destroyAllWindows()
     pose_detector.close()